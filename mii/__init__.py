@@ -1,12 +1,24 @@
 # mii/__init__.py
+import io
 import os
+import copy
+import time
+import asyncio
 import logging
-from PIL import Image
+import threading
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor, CancelledError
+from concurrent.futures import TimeoutError as FutureTimeout
+from PIL import Image, ImageChops, ImageOps, ImageStat
 
 from .process import BackendProcess
 from .client import FFLClient
 from .models import RenderSettings
 from .assets import AssetManager
+from .scheduler import RenderScheduler
+from .cache import LRUCache, MeshCache
+from .cluster import NodePool
+from .exceptions import MiiError, RenderError, RenderTimeout, QueueFullError
 
 # Re-export enums for user convenience
 from .constants import *
@@ -16,38 +28,340 @@ logging.basicConfig(level=logging.INFO, format='%(message)s')
 logger = logging.getLogger("miipy")
 
 class MiiPy:
-    def __init__(self, port=12346, auto_start=True, show_logs=False):
-        # 1. Setup paths and assets
-        package_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(package_dir)
-        assets = AssetManager(root_dir)
-
-        # 2. Auto-Build if binary is missing
-        if not assets.get_binary_path():
-            logger.warning("Backend executable not found. Attempting to build automatically...")
-            from .builder import build_backend
-            build_backend()
-
-        # 3. Verify resource file exists
-        resource_path = assets.get_resource_path()
-        if not resource_path:
-            raise FileNotFoundError("FFLResHigh.dat not found in FFL-Testing/ or project root.")
+    def __init__(self, port=12346, auto_start=True, show_logs=False,
+                 connect_timeout=5.0, read_timeout=30.0, workers=None, max_queue=64,
+                 mesh_cache_dir=None, compress=False, endpoints=None, local=True,
+                 health_interval=5.0):
+        if not local and not endpoints:
+            raise ValueError("Nothing to render on: pass endpoints or keep local=True.")
+
+        self.process = None
+        if local:
+            # 1. Setup paths and assets
+            package_dir = os.path.dirname(os.path.abspath(__file__))
+            root_dir = os.path.dirname(package_dir)
+            assets = AssetManager(root_dir)
+
+            # 2. Auto-Build if binary is missing
+            if not assets.get_binary_path():
+                logger.warning("Backend executable not found. Attempting to build automatically...")
+                from .builder import build_backend
+                build_backend()
+
+            # 3. Verify resource file exists
+            resource_path = assets.get_resource_path()
+            if not resource_path:
+                raise FileNotFoundError("FFLResHigh.dat not found in FFL-Testing/ or project root.")
+
+            self.process = BackendProcess(resource_path, port, show_logs)
 
         # 4. Initialize components
-        self.process = BackendProcess(resource_path, port, show_logs)
-        self.client = FFLClient(port=port)
+        if endpoints:
+            # Remote render nodes, plus the local backend as one more node
+            self.client = NodePool(
+                endpoints, health_interval=health_interval,
+                connect_timeout=connect_timeout, read_timeout=read_timeout
+            )
+            if local:
+                self.client.add_node(("127.0.0.1", port))
+        else:
+            self.client = FFLClient(port=port, connect_timeout=connect_timeout, read_timeout=read_timeout)
+
+        # By default keep one render in flight per backend, also as nodes come and go
+        if workers is None:
+            workers = len(self.client) if endpoints else 1
+            if endpoints:
+                self.client.on_change = lambda pool: self.scheduler.resize(len(pool))
+        self.scheduler = RenderScheduler(workers=workers, max_queue=max_queue)
+        self.mesh_cache = MeshCache(mesh_cache_dir)
+        self.layer_cache = LRUCache(max_entries=128)
+        # Whether the backend's split modes give usable head/body layers. None until checked.
+        self.split_layers = None
+        # Ask the backend for RLE-compressed frames. Plain TGA replies are still accepted.
+        self.compress = compress
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+        # Finishes progressive renders (resize, save) off the render workers
+        self._finisher = ThreadPoolExecutor(thread_name_prefix="miipy-finish")
+        # Runs progressive callbacks one at a time. Kept apart from the finishers, so a
+        # callback waiting on another progressive render never blocks its completion.
+        self._callbacks = ThreadPoolExecutor(max_workers=1, thread_name_prefix="miipy-callback")
+        # Exports in progress, so concurrent requests for one model share a backend call
+        self._exports = {}
+        self._exports_lock = threading.Lock()
         
-        if auto_start:
+        if auto_start and self.process:
             self.process.start()
+        if endpoints:
+            self.client.start_health_checks()
+
+    def render(self, source, out=None, size=512, timeout=None, deadline=None,
+               priority=Priority.INTERACTIVE, progressive=False, session=None,
+               callback=None, preview_size=128, autocrop=False, fit_padding=0, **kwargs):
+        """
+        Renders a Mii and returns a PIL Image.
+        With progressive=True a ProgressiveRender is returned instead, holding a
+        cheap preview and a future for the full image (see ProgressiveRender).
+        With autocrop=True the image is cropped to the visible Mii plus
+        `fit_padding` transparent pixels, at the scale the full `size` frame would have.
+        """
+        mii_data = self._load(source)
+        settings = self._build_settings(kwargs, size)
+        deadline = self._deadline(timeout, deadline)
+
+        if progressive:
+            return self._render_progressive(
+                settings, mii_data, size, out, priority, deadline,
+                session, callback, preview_size, autocrop, fit_padding
+            )
+        
+        # Get the raw image from the backend, queued behind higher priority work
+        render = functools.partial(self.client.render_image, autocrop=autocrop)
+        img = self._submit(render, settings.pack(mii_data), priority, deadline)
+        return self._finish(img, size, out, fit_padding)
+
+    def render_sizes(self, source, sizes=(512, 256, 128, 64, 32), out=None,
+                     timeout=None, deadline=None, priority=Priority.INTERACTIVE, **kwargs):
+        """
+        Renders once at the largest size and derives the others from it.
+        Returns a {size: Image} dict. If `out` is a template such as
+        "avatar_{size}.png", every size is also saved, encoded in parallel.
+        """
+        sizes = sorted({int(s) for s in sizes}, reverse=True)
+        if not sizes or sizes[-1] <= 0:
+            raise ValueError(f"Sizes must be positive, got {sizes}")
+        if out and "{size}" not in out:
+            raise ValueError(f"Output template must contain '{{size}}', got '{out}'")
+
+        mii_data = self._load(source)
+        settings = self._build_settings(kwargs, sizes[0])
+        img = self._submit(
+            self.client.render_image, settings.pack(mii_data),
+            priority, self._deadline(timeout, deadline)
+        )
+
+        # Cascade: each level is downscaled from the previous one, not from the
+        # original, so every LANCZOS pass only works on a small step.
+        images = {}
+        for size in sizes:
+            if img.width != size:
+                img = img.resize((size, size), resample=Image.Resampling.LANCZOS)
+            images[size] = img
+
+        if out:
+            with ThreadPoolExecutor(max_workers=len(images)) as pool:
+                list(pool.map(lambda item: item[1].save(out.format(size=item[0])), images.items()))
+
+        return images
+
+    def render_layered(self, source, out=None, size=512, timeout=None, deadline=None,
+                       priority=Priority.INTERACTIVE, **kwargs):
+        """
+        Renders the body and head as separate transparent layers and composites
+        them over a solid background in Python.
+        Each layer is cached under the settings that affect it, so changing
+        bg_color only recomposites and changing clothes_color or pants_color
+        only re-renders the body.
+        """
+        self._check_thread()
+        mii_data = self._load(source)
+        settings = self._build_settings(kwargs, size)
+        deadline = self._deadline(timeout, deadline)
+
+        if self.split_layers is False:
+            wanted = (('model', SplitMode.NONE),)
+        else:
+            wanted = (('body', SplitMode.BODY), ('head', SplitMode.HEAD))
+            if self.split_layers is None:
+                # First use: also render the whole model to check the split against
+                wanted += (('model', SplitMode.NONE),)
+
+        # Queue every missing layer before waiting, so they can render side by side
+        pending = {}
+        for name, mode in wanted:
+            key = settings.layer_key(mii_data, name)
+            img = self.layer_cache.get(key)
+            if img is None:
+                layer_settings = copy.copy(settings)
+                layer_settings.split_mode = mode
+                layer_settings.bg_color = (0, 0, 0, 0)
+                img = self.scheduler.submit(
+                    self.client.render_image, layer_settings.pack(mii_data),
+                    priority=priority, deadline=deadline
+                )
+            pending[name] = (key, img)
+
+        layers = {}
+        for name, (key, img) in pending.items():
+            if isinstance(img, Future):
+                img = self._wait(img)
+                self.layer_cache.put(key, img)
+            layers[name] = img
+
+        if self.split_layers is None:
+            self.split_layers = _is_split(layers)
+            if not self.split_layers:
+                logger.warning("Backend split modes don't produce head/body layers. "
+                               "Layered renders will cache the whole model instead.")
+
+        order = ('body', 'head') if self.split_layers else ('model',)
+        composite = Image.new('RGBA', layers[order[0]].size, tuple(settings.bg_color))
+        for name in order:
+            composite = Image.alpha_composite(composite, layers[name])
+
+        return self._finish(composite, size, out)
+
+    def export_model(self, source, out=None, sink=None, timeout=None, deadline=None,
+                     priority=Priority.INTERACTIVE, **kwargs):
+        """
+        Exports the Mii as a glTF model instead of an image and returns its bytes.
+        Models are cached by content, so the same Mii and geometry settings
+        only hit the backend once, even when requested concurrently.
+        If `sink` (a writable binary file object) is given, the model is written
+        to it while it streams in from the backend.
+        """
+        mii_data = self._load(source)
+        settings = self._build_settings(kwargs)
+        settings.export_as_gltf = True
+        deadline = self._deadline(timeout, deadline)
+
+        key = settings.mesh_key(mii_data)
+        model = self.mesh_cache.get(key)
+        if model is None:
+            with self._exports_lock:
+                pending = self._exports.get(key)
+                leader = pending is None
+                if leader:
+                    # An export that finished since the first lookup has already filled the cache
+                    model = self.mesh_cache.get(key)
+                    if model is None:
+                        pending = self._exports[key] = Future()
+
+            if not leader:
+                model = self._wait(pending, deadline)
+            elif model is None:
+                # Only a caller's sink is streamed into: without one NodePool can fail over
+                export = self.client.export_model
+                if sink is not None:
+                    buffer = _Tee(sink)
+                    export = functools.partial(export, sink=buffer)
+                try:
+                    model = self._submit(export, settings.pack(mii_data), priority, deadline)
+                    if sink is not None:
+                        model = buffer.getvalue()
+                    self.mesh_cache.put(key, model)
+                    pending.set_result(model)
+                except BaseException as e:
+                    pending.set_exception(e)
+                    raise
+                finally:
+                    with self._exports_lock:
+                        del self._exports[key]
+                sink = None # Already streamed
+
+        if sink is not None:
+            sink.write(model)
+
+        if out:
+            with open(out, "wb") as f:
+                f.write(model)
+
+        return model
+
+    def _render_progressive(self, settings, mii_data, size, out, priority, deadline,
+                            session, callback, preview_size, autocrop=False, fit_padding=0):
+        self._check_thread()
+        # `resolution` also sets the camera distance (see 'zoom'), so the preview keeps
+        # it to stay framed like the full render and saves on textures, AA and shading
+        preview_settings = copy.copy(settings)
+        preview_settings.tex_resolution = min(int(preview_size), settings.tex_resolution)
+        preview_settings.aa_method = 0
+        preview_settings.shader_type = ShaderType.SIMPLE
+
+        # Queue both right away so the full render starts as soon as the preview is done
+        render = functools.partial(self.client.render_image, autocrop=autocrop)
+        preview = self.scheduler.submit(
+            render, preview_settings.pack(mii_data),
+            priority=Priority.INTERACTIVE, deadline=deadline
+        )
+        full = self.scheduler.submit(
+            render, settings.pack(mii_data),
+            priority=priority, deadline=deadline
+        )
+        result = ProgressiveRender(
+            None, _chain(full, lambda img: self._finish(img, size, out, fit_padding), self._finisher)
+        )
+
+        # A newer request for the same session makes the previous full render stale
+        if session is not None:
+            with self._sessions_lock:
+                stale = self._sessions.get(session)
+                self._sessions[session] = result
+            if stale is not None:
+                stale.cancel()
+            result.future.add_done_callback(lambda f: self._forget(session, result))
+
+        if callback is not None:
+            result.future.add_done_callback(lambda f: self._run_callback(callback, f))
+
+        try:
+            img = self._wait(preview)
+        except BaseException:
+            result.cancel()
+            raise
+        # The preview only needs to be fast, not pretty
+        result.preview = self._finish(img, size, fit_padding=fit_padding,
+                                      resample=Image.Resampling.BILINEAR)
+        return result
+
+    def _run_callback(self, callback, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+
+        def run(img):
+            try:
+                callback(img)
+            except Exception:
+                logger.exception("Progressive render callback failed")
+
+        try:
+            self._callbacks.submit(run, future.result())
+        except RuntimeError: # Executor shut down by close()
+            pass
+
+    def _forget(self, session, result):
+        with self._sessions_lock:
+            if self._sessions.get(session) is result:
+                del self._sessions[session]
+
+    def _finish(self, img, size, out=None, fit_padding=0, resample=Image.Resampling.LANCZOS):
+        frame = img.info.get('frame_size')
+        if frame:
+            # Autocropped: scale the opaque region exactly as the whole frame would have been
+            scale = size / frame[0]
+            if scale != 1:
+                cropped = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+                img = img.resize(cropped, resample=resample)
+            if fit_padding:
+                img = ImageOps.expand(img, border=int(fit_padding), fill=(0, 0, 0, 0))
+        # Resize if we used the zoom feature (render_res != size)
+        elif img.width != size:
+            img = img.resize((size, size), resample=resample)
+        
+        if out:
+            img.save(out)
+        
+        return img
 
-    def render(self, source, out=None, size=512, **kwargs):
+    def _load(self, source):
         # Load Mii data
         if isinstance(source, str):
-            with open(source, "rb") as f: mii_data = f.read(96)
-        else:
-            mii_data = source
+            with open(source, "rb") as f: return f.read(96)
+        return source
 
+    def _build_settings(self, kwargs, size=512):
         settings = RenderSettings()
+        settings.compress_response = self.compress
         
         # 1. Handle special 'zoom' argument for camera distance
         # It controls the virtual render resolution.
@@ -65,39 +379,55 @@ class MiiPy:
                 setattr(settings, k, v)
             else:
                 logger.warning(f"Ignoring unknown parameter '{k}'")
-        
-        # Get the raw image from the backend
-        img = self.client.render_image(settings.pack(mii_data))
-        
-        # Resize if we used the zoom feature (render_res != size)
-        if img.width != size:
-            img = img.resize((size, size), resample=Image.Resampling.LANCZOS)
-        
-        if out:
-            img.save(out)
-        
-        return img
+
+        return settings
+
+    def _deadline(self, timeout, deadline):
+        if timeout is not None:
+            return time.monotonic() + timeout
+        return deadline
+
+    def _check_thread(self):
+        # A worker waiting for another render could wait forever: the job may be
+        # queued behind it, with no free worker left to run it.
+        if self.scheduler.in_worker():
+            raise RenderError("Cannot render from a render worker thread.")
+
+    def _submit(self, func, payload, priority, deadline):
+        self._check_thread()
+        future = self.scheduler.submit(func, payload, priority=priority, deadline=deadline)
+        return self._wait(future)
+
+    def _wait(self, future, deadline=None):
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            return future.result(timeout)
+        except CancelledError:
+            raise RenderError("Render was cancelled.")
+        except FutureTimeout:
+            raise RenderTimeout("Deadline expired while waiting for the result.")
 
     def animate(self, source, size=512, **kwargs):
-        if isinstance(source, str):
-            with open(source, "rb") as f: mii_data = f.read(96)
-        else: mii_data = source
+        mii_data = self._load(source)
+        # Initial settings for the animation context, handled just like in render()
+        settings = self._build_settings(kwargs, size)
+        return AnimationContext(self, settings, mii_data, size)
 
-        settings = RenderSettings()
-        
-        # Apply initial settings for the animation context
-        # Handle 'view' and other kwargs just like in render()
-        if 'view' in kwargs:
-            settings.view_type = kwargs.pop('view')
-        
-        for k, v in kwargs.items():
-            if hasattr(settings, k):
-                setattr(settings, k, v)
-        
-        return AnimationContext(self.client, settings, mii_data, size)
+    def stats(self):
+        """Returns render queue metrics (depth, wait times, rejections) and node health."""
+        stats = self.scheduler.stats()
+        if isinstance(self.client, NodePool):
+            stats["nodes"] = self.client.stats()
+        return stats
 
     def close(self):
-        self.process.stop()
+        self.scheduler.close()
+        self._finisher.shutdown(wait=False)
+        self._callbacks.shutdown(wait=False)
+        if isinstance(self.client, NodePool):
+            self.client.close()
+        if self.process:
+            self.process.stop()
 
     def __enter__(self):
         return self
@@ -105,14 +435,110 @@ class MiiPy:
     def __exit__(self, *args):
         self.close()
 
+class ProgressiveRender:
+    """
+    A preview image that is available now and a full render that arrives later.
+
+    The full image can be collected with result(), a callback passed to
+    render(), or by iterating: both `for img in r` and `async for img in r`
+    yield the preview first and then the full image.
+    A newer progressive request for the same session cancels this one.
+    Callbacks run on the renderer's callback thread, not on a render worker.
+    """
+
+    def __init__(self, preview, future):
+        self.preview = preview
+        self.future = future
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+    def cancel(self):
+        return self.future.cancel()
+
+    def cancelled(self):
+        return self.future.cancelled()
+
+    def __iter__(self):
+        yield self.preview
+        yield self.result()
+
+    def __aiter__(self):
+        return self._aiter()
+
+    async def _aiter(self):
+        yield self.preview
+        yield await asyncio.wrap_future(self.future)
+
+def _is_split(layers):
+    """True if the body and head layers add up to the whole model and neither is the whole model."""
+    body, head, model = layers['body'], layers['head'], layers['model']
+    if not body.size == head.size == model.size:
+        return False
+
+    def same(a, b):
+        # Allow for small differences along anti-aliased edges
+        return max(ImageStat.Stat(ImageChops.difference(a, b)).mean) < 1.0
+
+    return same(Image.alpha_composite(body, head), model) and not same(body, model) and not same(head, model)
+
+class _Tee(io.BytesIO):
+    """Keeps a copy of everything written while passing it on to `sink`."""
+
+    def __init__(self, sink=None):
+        super().__init__()
+        self.sink = sink
+
+    def write(self, data):
+        if self.sink is not None:
+            self.sink.write(data)
+        return super().write(data)
+
+def _chain(inner, transform, executor):
+    """
+    Returns a future for transform(inner result), computed on `executor`, which
+    is also where callbacks of the returned future run. Cancelling it also cancels
+    `inner` if that is still queued; a render already in flight finishes but
+    its result is dropped.
+    """
+    outer = Future()
+
+    def finish(f):
+        if not outer.set_running_or_notify_cancel():
+            return
+        try:
+            outer.set_result(transform(f.result()))
+        except BaseException as e:
+            outer.set_exception(e)
+
+    def on_inner_done(f):
+        if f.cancelled():
+            outer.cancel()
+            return
+        try:
+            executor.submit(finish, f)
+        except RuntimeError: # Executor shut down by close()
+            outer.cancel()
+
+    def on_outer_done(f):
+        if f.cancelled():
+            inner.cancel()
+
+    outer.add_done_callback(on_outer_done)
+    inner.add_done_callback(on_inner_done)
+    return outer
+
 class AnimationContext:
-    def __init__(self, client, settings, mii_data, output_size):
-        self.client = client
+    def __init__(self, renderer, settings, mii_data, output_size):
+        self.renderer = renderer
+        self.client = renderer.client
         self.settings = settings
         self.data = mii_data
         self.output_size = output_size
+        # Each context is its own progressive session, so a new frame supersedes the last one
+        self.session = object()
 
-    def frame(self, **changes):
+    def frame(self, progressive=False, callback=None, preview_size=128, **changes):
         # Update settings for this specific frame
         for k, v in changes.items():
             # Handle aliases within animation frames
@@ -124,11 +550,16 @@ class AnimationContext:
                 self.settings.view_type = v
             elif hasattr(self.settings, k):
                 setattr(self.settings, k, v)
+
+        if progressive:
+            return self.renderer._render_progressive(
+                self.settings, self.data, self.output_size, None,
+                Priority.INTERACTIVE, None, self.session, callback, preview_size
+            )
         
-        img = self.client.render_image(self.settings.pack(self.data))
+        img = self.renderer._submit(
+            self.client.render_image, self.settings.pack(self.data), Priority.INTERACTIVE, None
+        )
         
         # Resize to the final output size if necessary
-        if img.width != self.output_size:
-            img = img.resize((self.output_size, self.output_size), resample=Image.Resampling.LANCZOS)
-            
-        return img
\ No newline at end of file
+        return self.renderer._finish(img, self.output_size)
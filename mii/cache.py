@@ -0,0 +1,98 @@
+# mii/cache.py
+import os
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+    """A small thread-safe in-memory LRU map."""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class MeshCache(LRUCache):
+    """
+    Content-addressed store for exported models.
+    Keys are hashes of everything that affects the geometry (see RenderSettings.mesh_key),
+    so the same Mii is only exported once. If `directory` is given, models are also
+    kept on disk as <key>.glb (binary glTF) or <key>.gltf (text glTF) and survive restarts.
+    """
+
+    EXTENSIONS = (".glb", ".gltf")
+
+    def __init__(self, directory=None, max_entries=64):
+        super().__init__(max_entries)
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, key, data=None):
+        """File name for a model. Without `data`, the existing file of either kind is returned."""
+        if not self.directory:
+            return None
+        if data is not None:
+            ext = ".glb" if data[:4] == b"glTF" else ".gltf"
+            return os.path.join(self.directory, key + ext)
+        for ext in self.EXTENSIONS:
+            path = os.path.join(self.directory, key + ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def get(self, key):
+        data = super().get(key)
+        if data is not None or not self.directory:
+            return data
+
+        path = self.path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        # Counted as a miss by the memory layer, but it still saved a backend call.
+        with self._lock:
+            self.misses -= 1
+            self.hits += 1
+        super().put(key, data)
+        return data
+
+    def put(self, key, data):
+        super().put(key, data)
+        if self.directory:
+            # Write to a temp file first so a crash never leaves a truncated model behind.
+            target = self.path(key, data)
+            tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, target)
@@ -1,42 +1,228 @@
 # mii/client.py
 import socket
 import io
-from .exceptions import RenderError
+import struct
+import time
+import logging
+from .constants import ResponseFormat
+from .exceptions import RenderError, RenderTimeout
 
 try:
     from PIL import Image
 except ImportError:
     raise ImportError("Pillow library not found. Run 'pip install pillow'")
 
+logger = logging.getLogger(__name__)
+
+# TGA image types
+_TGA_RAW = 2
+_TGA_RLE = 10
+
+# Position of the response format byte in a packed request (after Mii data, its size and the model flag)
+_RESPONSE_FMT_OFFSET = struct.calcsize('<96sHB')
+
+def alpha_bbox(raw, width, height):
+    """
+    Finds the non-transparent region of a raw BGRA buffer.
+    Returns (left, top, right, bottom) in buffer row order, or None if every pixel is transparent.
+    """
+    # Slicing out the alpha bytes and scanning them both run in C.
+    alpha = Image.frombytes('L', (width, height), raw[3::4])
+    return alpha.getbbox()
+
+class _BadReply(RenderError):
+    """The backend accepted the request, then hung up or sent something unexpected."""
+
+def _with_format(payload, response_fmt):
+    payload = bytearray(payload)
+    payload[_RESPONSE_FMT_OFFSET] = response_fmt
+    return bytes(payload)
+
 class FFLClient:
-    def __init__(self, port=12346):
-        self.host = "127.0.0.1"
+    def __init__(self, port=12346, host="127.0.0.1", connect_timeout=5.0, read_timeout=30.0):
+        self.host = host
         self.port = port
+        # Timeouts are in seconds. None disables the limit.
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # Whether the backend answers RLE requests with RLE. None until it has been asked.
+        self.rle_supported = None
+
+    def render_image(self, payload: bytes, deadline=None, autocrop=False) -> Image.Image:
+        """
+        Sends a packed request and decodes the TGA response (raw or RLE).
+        `deadline` is an optional time.monotonic() value the whole request must finish by.
+        With autocrop=True only the non-transparent region is decoded; its position is
+        stored in img.info['crop_box'] and the full frame size in img.info['frame_size'].
+        If the backend takes an RLE request but hangs up or sends a bad reply, it is
+        repeated as plain TGA and later requests are downgraded up front. Connection
+        errors and timeouts are raised as usual.
+        """
+        wants_rle = payload[_RESPONSE_FMT_OFFSET] == ResponseFormat.TGA_RLE
+        if wants_rle and self.rle_supported is False:
+            return self._render(_with_format(payload, ResponseFormat.TGA), deadline, autocrop)
 
-    def render_image(self, payload: bytes) -> Image.Image:
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((self.host, self.port))
-                s.sendall(payload)
+            return self._render(payload, deadline, autocrop)
+        except _BadReply as e:
+            if not wants_rle or self.rle_supported:
+                raise
+            logger.warning(f"Backend failed an RLE request ({e}). Falling back to plain TGA.")
+            self.rle_supported = False
+            return self._render(_with_format(payload, ResponseFormat.TGA), deadline, autocrop)
 
-                header = self._recv_exact(s, 18)
-                width = header[12] + (header[13] << 8)
-                height = header[14] + (header[15] << 8)
-                
-                body_size = width * height * 4
-                raw_pixels = self._recv_exact(s, body_size)
-                
-                # Optimized decode
-                img = Image.frombytes('RGBA', (width, height), bytes(raw_pixels), 'raw', 'BGRA')
-                return img.transpose(Image.FLIP_TOP_BOTTOM)
+    def _render(self, payload, deadline, autocrop):
+        wants_rle = payload[_RESPONSE_FMT_OFFSET] == ResponseFormat.TGA_RLE
+        try:
+            with self._connect(deadline) as s:
+                s.sendall(payload)
+                try:
+                    return self._read_image(s, wants_rle, deadline, autocrop)
+                except (RenderTimeout, socket.timeout):
+                    raise
+                except RenderError as e:
+                    raise _BadReply(str(e)) from e
+                except Exception as e:
+                    raise _BadReply(f"Render failed: {e}") from e
 
+        except RenderError:
+            raise
+        except socket.timeout as e:
+            raise RenderTimeout(f"Render timed out: {e}")
         except Exception as e:
             raise RenderError(f"Render failed: {e}")
 
-    def _recv_exact(self, sock, size):
+    def _read_image(self, s, wants_rle, deadline, autocrop):
+        header = self._recv_exact(s, 18, deadline)
+        width = header[12] + (header[13] << 8)
+        height = header[14] + (header[15] << 8)
+        if header[0]:
+            self._recv_exact(s, header[0], deadline) # Skip the image ID field
+
+        if header[2] == _TGA_RLE:
+            raw_pixels = self._recv_rle(s, width * height, deadline)
+            self.rle_supported = True
+        elif header[2] == _TGA_RAW:
+            raw_pixels = self._recv_exact(s, width * height * 4, deadline)
+            if wants_rle:
+                # Answered, just not compressed: stop asking
+                self.rle_supported = False
+        else:
+            raise RenderError(f"Unsupported TGA image type {header[2]}")
+
+        return self._decode(raw_pixels, width, height, autocrop)
+
+    def export_model(self, payload: bytes, sink=None, deadline=None):
+        """
+        Sends a packed glTF export request and streams the model back.
+        Binary glTF (GLB) is framed by the total length in its 12-byte header.
+        Text glTF has no length, so it is read until the backend closes the connection.
+        Chunks are written to `sink` as they arrive; without a sink the model is returned as bytes.
+        """
+        out = sink if sink is not None else io.BytesIO()
+        try:
+            with self._connect(deadline) as s:
+                s.sendall(payload)
+
+                header = self._recv_exact(s, 12, deadline)
+                if header[:4] == b"glTF":
+                    total = struct.unpack_from("<I", header, 8)[0]
+                    if total < 12:
+                        raise RenderError(f"Invalid GLB length: {total}")
+                    out.write(header)
+                    written = 12 + self._stream(s, out, total - 12, deadline)
+                elif header.lstrip()[:1] == b"{":
+                    out.write(header)
+                    written = 12 + self._stream(s, out, None, deadline)
+                else:
+                    raise RenderError("Backend did not return a glTF model.")
+
+        except RenderError:
+            raise
+        except socket.timeout as e:
+            raise RenderTimeout(f"Export timed out: {e}")
+        except Exception as e:
+            raise RenderError(f"Export failed: {e}")
+
+        return out.getvalue() if sink is None else written
+
+    def _stream(self, sock, out, size, deadline):
+        """Copies `size` bytes (or everything until EOF if None) from the socket to `out`."""
+        written = 0
+        while size is None or written < size:
+            if deadline is not None:
+                sock.settimeout(self._timeout(self.read_timeout, deadline))
+            want = 65536 if size is None else min(65536, size - written)
+            chunk = sock.recv(want)
+            if not chunk:
+                if size is None: break
+                raise RenderError("Connection closed.")
+            out.write(chunk)
+            written += len(chunk)
+        return written
+
+    def _decode(self, raw, width, height, autocrop):
+        # TGA rows are stored bottom-up; orientation -1 flips while decoding.
+        stride = width * 4
+        box = alpha_bbox(raw, width, height) if autocrop else None
+        if box is None:
+            return Image.frombytes('RGBA', (width, height), raw, 'raw', 'BGRA', stride, -1)
+
+        # Decode only the opaque rectangle, straight out of the receive buffer
+        left, top, right, bottom = box
+        region = memoryview(raw)[(top * width + left) * 4:bottom * stride]
+        img = Image.frombytes('RGBA', (right - left, bottom - top), region, 'raw', 'BGRA', stride, -1)
+        img.info['crop_box'] = (left, height - bottom, right, height - top)
+        img.info['frame_size'] = (width, height)
+        return img
+
+    def _recv_rle(self, sock, pixel_count, deadline):
+        """Reads and expands an RLE-compressed (type 10) TGA body of 32-bit pixels."""
+        sock.settimeout(self._timeout(self.read_timeout, deadline))
+        size = pixel_count * 4
+        out = bytearray()
+        with sock.makefile('rb') as f:
+            def read(n):
+                if deadline is not None:
+                    sock.settimeout(self._timeout(self.read_timeout, deadline))
+                data = f.read(n)
+                if len(data) < n: raise RenderError("Connection closed.")
+                return data
+
+            while len(out) < size:
+                packet = read(1)[0]
+                count = (packet & 0x7F) + 1
+                if packet & 0x80:
+                    out += read(4) * count # Run of one repeated pixel
+                else:
+                    out += read(4 * count) # Literal pixels
+
+        del out[size:]
+        return out
+
+    def _connect(self, deadline):
+        s = socket.create_connection(
+            (self.host, self.port), timeout=self._timeout(self.connect_timeout, deadline)
+        )
+        s.settimeout(self._timeout(self.read_timeout, deadline))
+        return s
+
+    def _timeout(self, limit, deadline):
+        """Returns the socket timeout to use, capped by the time left until the deadline."""
+        if deadline is None:
+            return limit
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise RenderTimeout("Deadline exceeded.")
+        return remaining if limit is None else min(limit, remaining)
+
+    def _recv_exact(self, sock, size, deadline=None):
         buf = bytearray()
         while len(buf) < size:
-            chunk = sock.recv(4096)
+            if deadline is not None:
+                sock.settimeout(self._timeout(self.read_timeout, deadline))
+            # Never read past `size`, or the start of the next field would be lost.
+            chunk = sock.recv(min(65536, size - len(buf)))
             if not chunk: raise RenderError("Connection closed.")
             buf.extend(chunk)
-        return buf
\ No newline at end of file
+        return buf
@@ -0,0 +1,252 @@
+# mii/cluster.py
+import bisect
+import hashlib
+import logging
+import socket
+import threading
+import time
+
+from .client import FFLClient
+from .exceptions import RenderError
+
+logger = logging.getLogger(__name__)
+
+def parse_endpoint(endpoint):
+    """Accepts "host:port" or a (host, port) tuple and returns (host, port)."""
+    if isinstance(endpoint, str):
+        host, sep, port = endpoint.rpartition(":")
+        if not sep or not host:
+            raise ValueError(f"Endpoint must look like 'host:port', got '{endpoint}'")
+        return host.strip("[]"), int(port)
+    host, port = endpoint
+    return host, int(port)
+
+# Longest wait before an ejected node is probed again, in health intervals
+_MAX_BACKOFF = 64
+
+def _hash(data: bytes) -> int:
+    return int.from_bytes(hashlib.md5(data).digest()[:8], "big")
+
+class RenderNode:
+    """One backend the pool can send requests to."""
+
+    def __init__(self, host, port, connect_timeout=5.0, read_timeout=30.0):
+        self.address = f"{host}:{port}"
+        self.client = FFLClient(port=port, host=host,
+                                connect_timeout=connect_timeout, read_timeout=read_timeout)
+        self.healthy = True
+        self.failures = 0
+        self.requests = 0
+        self.last_error = None
+        # Ejections since the last successful request, and when to probe again
+        self.ejections = 0
+        self.retry_at = 0.0
+
+class NodePool:
+    """
+    Spreads renders over several backends.
+
+    Requests are placed on a consistent-hash ring by the Mii data in the
+    payload, so renders of the same Mii keep landing on the node that already
+    has it cached, and adding or removing a node only moves the keys next to
+    it on the ring. Nodes that fail `max_failures` times in a row are ejected
+    and skipped; the health check brings them back once they accept
+    connections again. A readmitted node is on probation: one more failure
+    ejects it again, and the wait before the next probe doubles each time,
+    so a node that accepts connections but fails renders doesn't flap.
+    Exposes the same render_image/export_model calls as FFLClient, so it can
+    be used in its place. `on_change(pool)` is called after nodes are added
+    or removed.
+    """
+
+    def __init__(self, endpoints=(), replicas=64, max_failures=3, health_interval=5.0,
+                 connect_timeout=5.0, read_timeout=30.0, on_change=None):
+        self.replicas = replicas
+        self.max_failures = max_failures
+        self.health_interval = health_interval
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.on_change = on_change
+
+        self._nodes = {}
+        self._ring = []
+        self._ring_keys = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._health_thread = None
+
+        for endpoint in endpoints:
+            self.add_node(endpoint)
+
+    def add_node(self, endpoint):
+        host, port = parse_endpoint(endpoint)
+        node = RenderNode(host, port, self.connect_timeout, self.read_timeout)
+        with self._lock:
+            if node.address in self._nodes:
+                return self._nodes[node.address]
+            self._nodes[node.address] = node
+            self._rebuild()
+        logger.info(f"Render node added: {node.address}")
+        self._changed()
+        return node
+
+    def remove_node(self, endpoint):
+        address = "%s:%d" % parse_endpoint(endpoint)
+        with self._lock:
+            if self._nodes.pop(address, None) is None:
+                return
+            self._rebuild()
+        logger.info(f"Render node removed: {address}")
+        self._changed()
+
+    @property
+    def nodes(self):
+        with self._lock:
+            return list(self._nodes.values())
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def route(self, payload: bytes):
+        """
+        Returns the nodes to try for this payload, in ring order.
+        Ejected nodes are left out unless no healthy node remains.
+        """
+        # The first 96 bytes are the Mii data; render settings don't move a Mii to another node
+        key = _hash(bytes(payload[:96]))
+        with self._lock:
+            ring, ring_keys, count = self._ring, self._ring_keys, len(self._nodes)
+        if not ring:
+            raise RenderError("No render nodes configured.")
+
+        order = []
+        start = bisect.bisect(ring_keys, key)
+        for i in range(len(ring)):
+            node = ring[(start + i) % len(ring)][1]
+            if node not in order:
+                order.append(node)
+                if len(order) == count:
+                    break
+
+        healthy = [n for n in order if n.healthy]
+        return healthy or order
+
+    def render_image(self, payload: bytes, deadline=None, **kwargs):
+        return self._call("render_image", payload, deadline, kwargs)
+
+    def export_model(self, payload: bytes, sink=None, deadline=None):
+        # A partly written sink can't be rewound, so streamed exports get a single attempt
+        if sink is not None:
+            node = self.route(payload)[0]
+            return self._attempt(node, "export_model", payload, deadline, {"sink": sink})
+        return self._call("export_model", payload, deadline, {})
+
+    def start_health_checks(self):
+        if self._health_thread or not self.health_interval:
+            return
+        self._stop.clear()
+        self._health_thread = threading.Thread(
+            target=self._health_loop, name="miipy-health", daemon=True
+        )
+        self._health_thread.start()
+
+    def check_health(self):
+        """
+        Probes every node once. Ejected nodes whose backoff has passed are
+        readmitted on probation if they accept connections. A successful
+        probe doesn't clear the failures of a node that is still in rotation;
+        only a successful request does.
+        """
+        now = time.monotonic()
+        for node in self.nodes:
+            if not node.healthy and now < node.retry_at:
+                continue
+            host, port = parse_endpoint(node.address)
+            try:
+                with socket.create_connection((host, port), timeout=self.connect_timeout):
+                    pass
+            except OSError as e:
+                self._mark_failed(node, e)
+                continue
+            with self._lock:
+                if node.healthy:
+                    continue
+                node.healthy = True
+                node.failures = self.max_failures - 1
+            logger.info(f"Render node back online, on probation: {node.address}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                n.address: {
+                    "healthy": n.healthy,
+                    "failures": n.failures,
+                    "ejections": n.ejections,
+                    "requests": n.requests,
+                    "last_error": n.last_error,
+                }
+                for n in self._nodes.values()
+            }
+
+    def close(self):
+        self._stop.set()
+        if self._health_thread:
+            self._health_thread.join(self.connect_timeout + 1)
+            self._health_thread = None
+
+    def _call(self, method, payload, deadline, kwargs):
+        error = None
+        for node in self.route(payload):
+            try:
+                return self._attempt(node, method, payload, deadline, kwargs)
+            except RenderError as e:
+                error = e
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+        raise error
+
+    def _attempt(self, node, method, payload, deadline, kwargs):
+        with self._lock:
+            node.requests += 1
+        try:
+            result = getattr(node.client, method)(payload, deadline=deadline, **kwargs)
+        except RenderError as e:
+            self._mark_failed(node, e)
+            raise
+        with self._lock:
+            node.failures = 0
+            node.ejections = 0
+        return result
+
+    def _mark_failed(self, node, error):
+        with self._lock:
+            node.failures += 1
+            node.last_error = str(error)
+            if not node.healthy or node.failures < self.max_failures:
+                return
+            node.healthy = False
+            node.ejections += 1
+            backoff = min(2 ** (node.ejections - 1), _MAX_BACKOFF) * self.health_interval
+            node.retry_at = time.monotonic() + backoff
+        logger.warning(f"Ejecting render node {node.address} for {backoff:.0f}s: {error}")
+
+    def _changed(self):
+        if self.on_change:
+            self.on_change(self)
+
+    def _rebuild(self):
+        """Recomputes the hash ring. Caller holds the lock."""
+        ring = []
+        for address, node in self._nodes.items():
+            for i in range(self.replicas):
+                ring.append((_hash(f"{address}#{i}".encode()), node))
+        ring.sort(key=lambda item: item[0])
+        self._ring = ring
+        self._ring_keys = [k for k, _ in ring]
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            try:
+                self.check_health()
+            except Exception as e:
+                logger.warning(f"Health check failed: {e}")
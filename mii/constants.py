@@ -74,4 +74,25 @@ class PantsColor:
     RED = 2
     GOLD = 3
     BODY = 4
-    NONE = 5
\ No newline at end of file
+    NONE = 5
+
+class SplitMode:
+    """
+    Which part of the model the backend draws, used for layered rendering.
+    render_layered() checks these against a full render on first use and
+    falls back to a single model layer if the backend splits differently.
+    """
+    NONE = 0 # The whole model in one image.
+    HEAD = 1
+    BODY = 2
+
+class ResponseFormat:
+    """What the backend sends back for a request."""
+    GLTF = 1
+    TGA = 2
+    TGA_RLE = 3 # Run-length encoded TGA. Much smaller for mostly transparent frames.
+
+class Priority:
+    """Scheduling classes for the render queue. Lower values are served first."""
+    INTERACTIVE = 0
+    BATCH = 1
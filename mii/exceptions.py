@@ -15,4 +15,12 @@ class BackendError(MiiError):
 
 class RenderError(MiiError):
     """Raised when network communication or image decoding fails."""
-    pass
\ No newline at end of file
+    pass
+
+class RenderTimeout(RenderError):
+    """Raised when a render times out or its deadline can no longer be met."""
+    pass
+
+class QueueFullError(RenderError):
+    """Raised when the render queue is full and a request is rejected."""
+    pass
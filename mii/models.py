@@ -1,8 +1,9 @@
 # mii/models.py
 import struct
+import hashlib
 from .constants import (
     ViewType, Expression, ResourceType, ShaderType, 
-    ClothesColor, PantsColor, ModelType
+    ClothesColor, PantsColor, ModelType, ResponseFormat
 )
 
 def _clamp(val, min_v, max_v):
@@ -16,6 +17,14 @@ class RenderSettings:
     # < = Little Endian
     STRUCT_FORMAT = '<96sHBBHhBbBBIIIhhhhhhBBBBBB???bbbbbBBhhhB'
 
+    # Settings that cannot change an exported model: camera, lighting, background
+    # and output resolution only matter for rasterised images. Everything else
+    # counts, so a new field causes a fresh export rather than a stale cache hit.
+    MESH_EXCLUDE = (
+        'resolution', 'camera_rot', 'bg_color', 'light_enable', 'light_direction',
+        'aa_method', 'compress_response',
+    )
+
     def __init__(self):
         self.resolution = 512
         self.tex_resolution = 512
@@ -43,8 +52,37 @@ class RenderSettings:
         self.verify_crc16 = True
         self.aa_method = 0
         self.export_as_gltf = False
+        self.compress_response = False
         self.expr_flags = (0, 0, 0)
 
+    # Settings that cannot change a given layer, so changing them keeps it cached.
+    # The background layer is drawn in Python, which is why bg_color never counts.
+    # The head is placed on the body model, so body_type affects both.
+    LAYER_EXCLUDE = {
+        'model': ('bg_color', 'split_mode', 'compress_response'),
+        'head': ('bg_color', 'split_mode', 'compress_response',
+                 'clothes_color', 'pants_color'),
+        'body': ('bg_color', 'split_mode', 'compress_response',
+                 'expression', 'expr_flags', 'flatten_nose', 'headwear_index', 'headwear_color'),
+    }
+
+    def cache_key(self, mii_data: bytes, fields) -> str:
+        """Hashes the Mii data together with the given settings fields."""
+        h = hashlib.sha256(mii_data)
+        h.update(repr(tuple(getattr(self, f) for f in fields)).encode())
+        return h.hexdigest()
+
+    def mesh_key(self, mii_data: bytes) -> str:
+        """Content address of the model this request exports."""
+        fields = sorted(k for k in vars(self) if k not in self.MESH_EXCLUDE)
+        return self.cache_key(mii_data, fields)
+
+    def layer_key(self, mii_data: bytes, layer: str) -> str:
+        """Cache key of one layer, built only from the settings that affect it."""
+        skip = self.LAYER_EXCLUDE[layer]
+        fields = sorted(k for k in vars(self) if k not in skip)
+        return f"{layer}:{self.cache_key(mii_data, fields)}"
+
     def pack(self, mii_data: bytes) -> bytes:
         if len(mii_data) != 96:
             raise ValueError(f"Mii data must be 96 bytes, got {len(mii_data)}")
@@ -53,9 +91,11 @@ class RenderSettings:
         if self.flatten_nose:
             model_flag |= (1 << 3)
 
-        response_fmt = 2 # TGA
+        response_fmt = ResponseFormat.TGA
         if self.export_as_gltf:
-            response_fmt = 1
+            response_fmt = ResponseFormat.GLTF
+        elif self.compress_response:
+            response_fmt = ResponseFormat.TGA_RLE
 
         return struct.pack(
             self.STRUCT_FORMAT,
@@ -0,0 +1,232 @@
+# mii/scheduler.py
+import itertools
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from .constants import Priority
+from .exceptions import RenderError, RenderTimeout, QueueFullError
+
+# Weight of the newest sample in the moving average of service times.
+_EWMA_ALPHA = 0.2
+
+# Marks the worker threads, see RenderScheduler.in_worker()
+_local = threading.local()
+
+class _Job:
+    __slots__ = ("func", "args", "priority", "deadline", "enqueued", "future")
+
+    def __init__(self, func, args, priority, deadline):
+        self.func = func
+        self.args = args
+        self.priority = priority
+        self.deadline = deadline
+        self.enqueued = time.monotonic()
+        self.future = Future()
+
+class RenderScheduler:
+    """
+    A bounded, priority-ordered queue in front of the backend.
+
+    A pool of worker threads drains the queue, so overload shows up as
+    rejected requests instead of an ever-growing number of blocked threads.
+    The pool can be resized with resize(), e.g. when render nodes come and go.
+    Interactive jobs are always picked before batch jobs, and jobs whose
+    deadline can no longer be met are rejected before they are queued.
+    """
+
+    def __init__(self, workers=1, max_queue=64):
+        self.workers = max(1, int(workers))
+        self.max_queue = max_queue
+        # Unbounded so stop markers always fit; max_queue is enforced in submit()
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._names = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._pending = Counter()
+        self._in_flight = 0
+        self._service_avg = None
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._expired = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._started = 0
+
+        self._threads = []
+        with self._lock:
+            for _ in range(self.workers):
+                self._spawn()
+
+    def submit(self, func, *args, priority=Priority.INTERACTIVE, deadline=None) -> Future:
+        """
+        Queues `func(*args, deadline=deadline)` and returns a Future for its result.
+        `deadline` is an optional time.monotonic() value.
+        Raises QueueFullError when the queue is full and RenderTimeout when the
+        estimated wait already exceeds the deadline.
+        """
+        with self._lock:
+            if self._closed:
+                raise RenderError("Scheduler is closed.")
+
+            if deadline is not None:
+                eta = self._estimate(priority)
+                if time.monotonic() + eta > deadline:
+                    self._rejected += 1
+                    raise RenderTimeout(f"Deadline cannot be met (estimated {eta:.2f}s).")
+
+            if sum(self._pending.values()) >= self.max_queue:
+                self._rejected += 1
+                raise QueueFullError(f"Render queue is full ({self.max_queue} pending).")
+
+            job = _Job(func, args, priority, deadline)
+            self._queue.put((priority, next(self._seq), job))
+
+            self._pending[priority] += 1
+            self._submitted += 1
+
+        return job.future
+
+    def resize(self, workers):
+        """
+        Changes the number of worker threads. New workers start right away;
+        surplus workers stop as soon as their current job is done.
+        """
+        workers = max(1, int(workers))
+        with self._lock:
+            if self._closed:
+                return
+            self.workers = workers
+            # Threads told to stop by an earlier resize may still be draining the queue
+            delta = workers - len(self._threads)
+            for _ in range(delta):
+                self._spawn()
+        for _ in range(-delta):
+            self._stop_one()
+
+    def in_worker(self):
+        """True when called from one of this scheduler's worker threads."""
+        return getattr(_local, "scheduler", None) is self
+
+    def stats(self):
+        """Returns a snapshot of queue depth, wait times and counters."""
+        with self._lock:
+            return {
+                "queue_depth": sum(self._pending.values()),
+                "queue_depth_by_priority": dict(self._pending),
+                "in_flight": self._in_flight,
+                "workers": self.workers,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "expired": self._expired,
+                "avg_wait": self._wait_total / self._started if self._started else 0.0,
+                "max_wait": self._wait_max,
+                "avg_service": self._service_avg or 0.0,
+            }
+
+    def close(self, timeout=2.0):
+        """Stops the workers. Jobs still waiting in the queue are cancelled."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+
+        while True:
+            try:
+                _, _, job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None: # Stop markers left by resize()
+                job.future.cancel()
+        with self._lock:
+            self._pending.clear()
+            threads = list(self._threads)
+
+        for _ in threads:
+            self._stop_one()
+        for t in threads:
+            t.join(timeout)
+
+    def _estimate(self, priority):
+        """Rough time until a new job of this priority would finish. Caller holds the lock."""
+        if self._service_avg is None:
+            return 0.0
+        ahead = self._in_flight + sum(n for p, n in self._pending.items() if p <= priority)
+        return (ahead / self.workers + 1) * self._service_avg
+
+    def _spawn(self):
+        """Starts one worker thread. Caller holds the lock."""
+        t = threading.Thread(target=self._worker, name=f"miipy-render-{next(self._names)}", daemon=True)
+        self._threads.append(t)
+        t.start()
+
+    def _stop_one(self):
+        # Wakes an idle worker so it notices it is surplus. Busy workers check after each job.
+        self._queue.put((float("inf"), next(self._seq), None))
+
+    def _retire(self):
+        """Removes the calling worker if there are more than wanted."""
+        with self._lock:
+            if self._closed or len(self._threads) > self.workers:
+                self._threads.remove(threading.current_thread())
+                return True
+        return False
+
+    def _worker(self):
+        _local.scheduler = self
+        while not self._retire():
+            _, _, job = self._queue.get()
+            if job is None:
+                continue # Woken by resize() or close(); _retire() decides
+
+            with self._lock:
+                self._pending[job.priority] -= 1
+                if self._pending[job.priority] <= 0:
+                    del self._pending[job.priority]
+
+            if not job.future.set_running_or_notify_cancel():
+                continue
+
+            start = time.monotonic()
+            if job.deadline is not None and start >= job.deadline:
+                with self._lock:
+                    self._expired += 1
+                job.future.set_exception(RenderTimeout("Deadline expired while queued."))
+                continue
+
+            with self._lock:
+                wait = start - job.enqueued
+                self._started += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+                self._in_flight += 1
+
+            ok = False
+            try:
+                result = job.func(*job.args, deadline=job.deadline)
+                ok = True
+            except BaseException as e:
+                job.future.set_exception(e)
+            finally:
+                elapsed = time.monotonic() - start
+                with self._lock:
+                    self._in_flight -= 1
+                    if ok:
+                        self._completed += 1
+                    else:
+                        self._failed += 1
+                    if self._service_avg is None:
+                        self._service_avg = elapsed
+                    else:
+                        self._service_avg += _EWMA_ALPHA * (elapsed - self._service_avg)
+
+            if ok:
+                job.future.set_result(result)
@@ -0,0 +1,45 @@
+# tests/conftest.py
+import pytest
+
+from mii import MiiPy
+from fake_backend import FakeBackend
+
+MII = bytes(96)
+
+@pytest.fixture
+def backend_factory():
+    """Starts fake backends on free ports and shuts them down after the test."""
+    started = []
+
+    def start(**kwargs):
+        backend = FakeBackend(**kwargs)
+        started.append(backend)
+        return backend
+
+    yield start
+    for backend in started:
+        backend.close()
+
+@pytest.fixture
+def backend(backend_factory):
+    return backend_factory()
+
+@pytest.fixture
+def renderer_factory(backend_factory):
+    """MiiPy instances that render on fake backends instead of a local process."""
+    started = []
+
+    def start(backends=None, **kwargs):
+        backends = backends or [backend_factory()]
+        kwargs.setdefault("health_interval", 0)
+        r = MiiPy(endpoints=[b.address for b in backends], local=False, **kwargs)
+        started.append(r)
+        return r
+
+    yield start
+    for r in started:
+        r.close()
+
+@pytest.fixture
+def renderer(renderer_factory):
+    return renderer_factory()
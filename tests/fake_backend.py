@@ -0,0 +1,141 @@
+# tests/fake_backend.py
+"""
+A stand-in for the FFL-Testing server, for tests and for trying out
+multi-node setups on one machine:
+
+    python tests/fake_backend.py 12350 12351 12352
+
+It reads one packed RenderSettings request per connection and answers with a
+TGA of the requested resolution (RLE-compressed if asked for): a red square in
+the middle of a transparent frame.
+"""
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mii.models import RenderSettings
+
+REQUEST_SIZE = struct.calcsize(RenderSettings.STRUCT_FORMAT)
+
+def make_tga(width, height, pixel=None, image_type=2):
+    """Builds a TGA header plus bottom-up BGRA pixels. pixel(x, y) returns (r, g, b, a)."""
+    header = bytearray(18)
+    header[2] = image_type
+    header[12:16] = struct.pack('<HH', width, height)
+    header[16] = 32
+    body = bytearray(width * height * 4)
+    if pixel is None:
+        pixel = lambda x, y: (255, 0, 0, 255) if (width // 4 <= x < width - width // 4 and
+                                                    height // 4 <= y < height - height // 4) else (0, 0, 0, 0)
+    for y in range(height):
+        for x in range(width):
+            r, g, b, a = pixel(x, y)
+            i = (y * width + x) * 4
+            body[i:i + 4] = bytes((b, g, r, a))
+    return bytes(header), bytes(body)
+
+def rle_encode(body):
+    """Packs BGRA pixels into TGA run-length packets."""
+    pixels = [body[i:i + 4] for i in range(0, len(body), 4)]
+    out = bytearray()
+    i = 0
+    while i < len(pixels):
+        run = 1
+        while i + run < len(pixels) and run < 128 and pixels[i + run] == pixels[i]:
+            run += 1
+        if run > 1:
+            out.append(0x80 | (run - 1))
+            out += pixels[i]
+            i += run
+        else:
+            literal = 1
+            while (i + literal < len(pixels) and literal < 128 and
+                   (i + literal + 1 >= len(pixels) or pixels[i + literal] != pixels[i + literal + 1])):
+                literal += 1
+            out.append(literal - 1)
+            for p in pixels[i:i + literal]:
+                out += p
+            i += literal
+    return bytes(out)
+
+def default_handler(request):
+    """Square frame of the requested resolution. RLE requests get an RLE reply."""
+    res = request[4]
+    header, body = make_tga(res, res)
+    if request[3] == 3:
+        header = bytearray(header)
+        header[2] = 10
+        return bytes(header) + rle_encode(body)
+    return header + body
+
+class FakeBackend:
+    """
+    Serves requests on 127.0.0.1. `handler(request_fields)` returns the reply bytes,
+    or None to hang up instead. `delay` is slept before answering. With
+    `chunk_delay` the reply trickles out in 1 KiB pieces. Every unpacked request
+    is kept in `requests`.
+    """
+
+    def __init__(self, port=0, handler=default_handler, delay=0.0, chunk_delay=0.0):
+        self.handler = handler
+        self.delay = delay
+        self.chunk_delay = chunk_delay
+        self.requests = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", port))
+        self.sock.listen(64)
+        self.port = self.sock.getsockname()[1]
+        self.address = f"127.0.0.1:{self.port}"
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def close(self):
+        # close() alone doesn't wake a thread blocked in accept(), and the port keeps listening
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            data = b""
+            while len(data) < REQUEST_SIZE:
+                chunk = conn.recv(REQUEST_SIZE - len(data))
+                if not chunk:
+                    return # Health probes connect and close without a request
+                data += chunk
+            request = struct.unpack(RenderSettings.STRUCT_FORMAT, data)
+            self.requests.append(request)
+            time.sleep(self.delay)
+            reply = self.handler(request)
+            if reply is None:
+                return # Hang up, like a backend rejecting the request
+            step = 1024 if self.chunk_delay else max(1, len(reply))
+            try:
+                for i in range(0, len(reply), step):
+                    conn.sendall(reply[i:i + step])
+                    time.sleep(self.chunk_delay)
+            except OSError:
+                pass
+
+if __name__ == "__main__":
+    backends = [FakeBackend(int(port)) for port in sys.argv[1:] or ["12346"]]
+    print("Fake backends on: " + ", ".join(b.address for b in backends))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,129 @@
+# tests/test_client.py
+import pytest
+
+from mii import FFLClient, RenderSettings, RenderError, RenderTimeout
+from fake_backend import make_tga, rle_encode
+
+def _payload(resolution=64):
+    settings = RenderSettings()
+    settings.resolution = resolution
+    return settings.pack(bytes(96))
+
+def test_header_and_body_in_one_segment(backend_factory):
+    # The whole reply goes out in one sendall, so the header is never read on its own
+    backend = backend_factory(handler=lambda req: b"".join(make_tga(req[4], req[4])))
+    img = FFLClient(port=backend.port).render_image(_payload(64))
+
+    assert img.size == (64, 64)
+    assert img.getpixel((32, 32)) == (255, 0, 0, 255)
+    assert img.getpixel((0, 0)) == (0, 0, 0, 0)
+
+def test_rows_are_flipped(backend_factory):
+    # Bottom-up TGA: buffer row 0 is the bottom of the image
+    header, body = make_tga(4, 4, lambda x, y: (y * 10, 0, 0, 255))
+    backend = backend_factory(handler=lambda req: header + body)
+    img = FFLClient(port=backend.port).render_image(_payload(4))
+
+    assert [img.getpixel((0, y))[0] for y in range(4)] == [30, 20, 10, 0]
+
+def test_read_timeout(backend_factory):
+    backend = backend_factory(delay=1.0)
+    client = FFLClient(port=backend.port, read_timeout=0.1)
+
+    with pytest.raises(RenderTimeout):
+        client.render_image(_payload())
+
+def test_deadline_caps_read_timeout(backend_factory):
+    import time
+    backend = backend_factory(delay=1.0)
+    client = FFLClient(port=backend.port, read_timeout=30.0)
+
+    start = time.monotonic()
+    with pytest.raises(RenderTimeout):
+        client.render_image(_payload(), deadline=start + 0.2)
+    assert time.monotonic() - start < 0.9
+
+def test_connection_closed_early(backend_factory):
+    backend = backend_factory(handler=lambda req: make_tga(64, 64)[0] + b"\0" * 100)
+
+    with pytest.raises(RenderError, match="Connection closed"):
+        FFLClient(port=backend.port).render_image(_payload(64))
+
+def _asymmetric(x, y):
+    return (x, y, 7, 255) if 30 <= x < 50 and 10 <= y < 20 else (0, 0, 0, 0)
+
+def test_autocrop_decodes_only_the_opaque_region(backend_factory):
+    backend = backend_factory(handler=lambda req: b"".join(make_tga(64, 48, _asymmetric)))
+    client = FFLClient(port=backend.port)
+    full = client.render_image(_payload(64))
+    cropped = client.render_image(_payload(64), autocrop=True)
+
+    assert cropped.info["frame_size"] == (64, 48)
+    assert cropped.info["crop_box"] == full.getbbox() == (30, 28, 50, 38)
+    assert cropped.tobytes() == full.crop(cropped.info["crop_box"]).tobytes()
+
+def test_autocrop_of_empty_frame_keeps_it(backend_factory):
+    backend = backend_factory(handler=lambda req: b"".join(make_tga(8, 8, lambda x, y: (0, 0, 0, 0))))
+    img = FFLClient(port=backend.port).render_image(_payload(8), autocrop=True)
+
+    assert img.size == (8, 8)
+    assert "crop_box" not in img.info
+
+def _rle_payload(resolution=64):
+    settings = RenderSettings()
+    settings.resolution = resolution
+    settings.compress_response = True
+    return settings.pack(bytes(96))
+
+def test_rle_matches_raw(backend):
+    client = FFLClient(port=backend.port)
+    compressed = client.render_image(_rle_payload())
+
+    assert backend.requests[-1][3] == 3 # TGA_RLE requested
+    assert client.rle_supported is True
+    assert compressed.tobytes() == client.render_image(_payload()).tobytes()
+
+def test_rle_literal_packets(backend_factory):
+    header, body = make_tga(16, 16, lambda x, y: (x * 16, y * 16, (x ^ y) & 1, 255))
+    header = bytearray(header)
+    header[2] = 10
+    backend = backend_factory(handler=lambda req: bytes(header) + rle_encode(body))
+    img = FFLClient(port=backend.port).render_image(_rle_payload(16))
+
+    assert img.getpixel((3, 15)) == (48, 0, 1, 255)
+
+def test_rle_falls_back_to_plain_tga(backend_factory):
+    # A backend that hangs up on the unknown response format
+    def handler(req):
+        return None if req[3] == 3 else b"".join(make_tga(req[4], req[4]))
+    backend = backend_factory(handler=handler)
+    client = FFLClient(port=backend.port)
+
+    assert client.render_image(_rle_payload()).size == (64, 64)
+    assert client.rle_supported is False
+    client.render_image(_rle_payload())
+    assert [r[3] for r in backend.requests] == [3, 2, 2]
+
+def test_rle_respects_deadline(backend_factory):
+    import time
+    # Every pixel differs, so the RLE reply is ~16 KiB of literals trickling in for ~0.8s
+    header, body = make_tga(64, 64, lambda x, y: (x, y, 0, 255))
+    header = bytearray(header)
+    header[2] = 10
+    reply = bytes(header) + rle_encode(body)
+    backend = backend_factory(handler=lambda req: reply, chunk_delay=0.05)
+    client = FFLClient(port=backend.port, read_timeout=30.0)
+
+    start = time.monotonic()
+    with pytest.raises(RenderTimeout):
+        client.render_image(_rle_payload(), deadline=start + 0.3)
+    assert time.monotonic() - start < 1.0
+
+def test_rle_kept_after_connection_refused(backend_factory):
+    backend = backend_factory()
+    backend.close()
+    client = FFLClient(port=backend.port)
+
+    with pytest.raises(RenderError):
+        client.render_image(_rle_payload())
+    assert client.rle_supported is None
@@ -0,0 +1,195 @@
+# tests/test_cluster.py
+import threading
+import time
+
+import pytest
+
+from mii import RenderSettings, RenderError
+from mii.cluster import NodePool
+
+from fake_backend import default_handler
+
+def _mii(i):
+    return i.to_bytes(2, "big") + bytes(94)
+
+def _payload(mii, resolution=32):
+    settings = RenderSettings()
+    settings.resolution = resolution
+    return settings.pack(mii)
+
+def _owner(pool, mii):
+    return pool.route(_payload(mii))[0].address
+
+def _mii_for(pool, address):
+    """First Mii whose preferred node is `address`."""
+    return next(_mii(i) for i in range(1000) if _owner(pool, _mii(i)) == address)
+
+@pytest.fixture
+def pool_factory():
+    started = []
+
+    def start(backends, **kwargs):
+        kwargs.setdefault("health_interval", 0)
+        pool = NodePool([b.address for b in backends], **kwargs)
+        started.append(pool)
+        return pool
+
+    yield start
+    for pool in started:
+        pool.close()
+
+def _flaky(broken):
+    """Accepts connections but hangs up on every request while broken[0] is set."""
+    return lambda req: None if broken[0] else default_handler(req)
+
+def test_same_mii_same_node(backend_factory, pool_factory):
+    backends = [backend_factory() for _ in range(3)]
+    pool = pool_factory(backends)
+    mii = _mii(7)
+
+    for resolution in (32, 64, 128):
+        pool.render_image(_payload(mii, resolution))
+    assert sorted(len(b.requests) for b in backends) == [0, 0, 3]
+
+def test_keys_are_spread(backend_factory, pool_factory):
+    pool = pool_factory([backend_factory() for _ in range(3)])
+    owners = [_owner(pool, _mii(i)) for i in range(300)]
+
+    assert all(owners.count(n.address) > 50 for n in pool.nodes)
+
+def test_removing_a_node_only_moves_its_keys(backend_factory, pool_factory):
+    backends = [backend_factory() for _ in range(3)]
+    pool = pool_factory(backends)
+    before = {i: _owner(pool, _mii(i)) for i in range(300)}
+
+    removed = backends[1].address
+    pool.remove_node(removed)
+    after = {i: _owner(pool, _mii(i)) for i in range(300)}
+    assert all(after[i] == before[i] for i in before if before[i] != removed)
+    assert removed not in after.values()
+
+    pool.add_node(removed)
+    assert {i: _owner(pool, _mii(i)) for i in range(300)} == before
+
+def test_failover_to_next_node(backend_factory, pool_factory):
+    dead, live = backend_factory(), backend_factory()
+    pool = pool_factory([dead, live])
+    dead.close()
+    mii = _mii_for(pool, dead.address)
+
+    assert pool.render_image(_payload(mii)).size == (32, 32)
+    assert pool.stats()[dead.address]["failures"] == 1
+    assert len(live.requests) == 1
+
+def test_all_nodes_down(backend_factory, pool_factory):
+    backend = backend_factory()
+    pool = pool_factory([backend])
+    backend.close()
+
+    with pytest.raises(RenderError):
+        pool.render_image(_payload(_mii(0)))
+
+def test_ejection(backend_factory, pool_factory):
+    bad, good = backend_factory(handler=_flaky([True])), backend_factory()
+    pool = pool_factory([bad, good], max_failures=2)
+    mii = _mii_for(pool, bad.address)
+
+    for _ in range(4):
+        pool.render_image(_payload(mii))
+
+    assert len(bad.requests) == 2 # Skipped once ejected
+    assert pool.stats()[bad.address]["healthy"] is False
+    assert [n.address for n in pool.route(_payload(mii))] == [good.address]
+
+def test_readmitted_node_that_still_fails_does_not_flap(backend_factory, pool_factory):
+    bad, good = backend_factory(handler=_flaky([True])), backend_factory()
+    pool = pool_factory([bad, good], max_failures=3)
+    mii = _mii_for(pool, bad.address)
+    for _ in range(3):
+        pool.render_image(_payload(mii))
+
+    # It accepts connections, so the health check lets it back in...
+    pool.check_health()
+    assert pool.stats()[bad.address]["healthy"] is True
+    # ...but one more failed render is enough to eject it again
+    pool.render_image(_payload(mii))
+    stats = pool.stats()[bad.address]
+    assert stats["healthy"] is False
+    assert stats["ejections"] == 2
+    assert len(bad.requests) == 4
+
+def test_ejection_backoff_doubles(backend_factory, pool_factory):
+    bad, good = backend_factory(handler=_flaky([True])), backend_factory()
+    pool = pool_factory([bad, good], max_failures=1, health_interval=10)
+    node = next(n for n in pool.nodes if n.address == bad.address)
+    mii = _mii_for(pool, bad.address)
+
+    pool.render_image(_payload(mii))
+    assert node.retry_at - time.monotonic() == pytest.approx(10, abs=1)
+    pool.check_health()
+    assert node.healthy is False # Still backing off
+
+    node.retry_at = 0
+    pool.check_health()
+    pool.render_image(_payload(mii))
+    assert node.healthy is False
+    assert node.retry_at - time.monotonic() == pytest.approx(20, abs=1)
+
+def test_recovered_node_is_trusted_again(backend_factory, pool_factory):
+    broken = [True]
+    bad, good = backend_factory(handler=_flaky(broken)), backend_factory()
+    pool = pool_factory([bad, good], max_failures=2)
+    mii = _mii_for(pool, bad.address)
+    for _ in range(2):
+        pool.render_image(_payload(mii))
+
+    broken[0] = False
+    pool.check_health()
+    pool.render_image(_payload(mii))
+
+    stats = pool.stats()[bad.address]
+    assert stats["healthy"] is True
+    assert stats["failures"] == 0
+    assert stats["ejections"] == 0
+
+def test_request_counts_under_concurrency(backend_factory, pool_factory):
+    backends = [backend_factory() for _ in range(2)]
+    pool = pool_factory(backends)
+
+    def render(i):
+        for j in range(10):
+            pool.render_image(_payload(_mii(i * 10 + j)))
+
+    threads = [threading.Thread(target=render, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+
+    assert sum(s["requests"] for s in pool.stats().values()) == 80
+
+def test_workers_follow_nodes(renderer_factory, backend_factory):
+    renderer = renderer_factory([backend_factory()])
+    assert renderer.scheduler.workers == 1
+
+    extra = backend_factory()
+    renderer.client.add_node(extra.address)
+    assert renderer.stats()["workers"] == 2
+    renderer.client.remove_node(extra.address)
+    assert renderer.stats()["workers"] == 1
+
+def test_explicit_workers_are_kept(renderer_factory, backend_factory):
+    renderer = renderer_factory([backend_factory()], workers=4)
+    renderer.client.add_node(backend_factory().address)
+
+    assert renderer.scheduler.workers == 4
+
+def test_miipy_export_fails_over(renderer_factory, backend_factory):
+    from test_export import glb_handler
+    dead, live = backend_factory(handler=glb_handler), backend_factory(handler=glb_handler)
+    renderer = renderer_factory([dead, live])
+    dead.close()
+    mii = _mii_for(renderer.client, dead.address)
+
+    assert renderer.export_model(mii)[:4] == b"glTF"
+    assert len(live.requests) == 1
@@ -0,0 +1,99 @@
+# tests/test_export.py
+import io
+import os
+import struct
+import threading
+
+import pytest
+
+from mii import FFLClient, RenderSettings, RenderError, RenderTimeout, Expression
+from mii.cache import MeshCache
+from conftest import MII
+
+GLB_BODY = b"x" * 70000
+
+def glb_handler(request):
+    # Trailing bytes after the GLB must not be read as part of the model
+    return b"glTF" + struct.pack("<II", 2, 12 + len(GLB_BODY)) + GLB_BODY + b"TRAILING"
+
+def _payload():
+    settings = RenderSettings()
+    settings.export_as_gltf = True
+    return settings.pack(MII)
+
+def test_glb_is_length_framed(backend_factory):
+    backend = backend_factory(handler=glb_handler)
+    model = FFLClient(port=backend.port).export_model(_payload())
+
+    assert model[:4] == b"glTF"
+    assert len(model) == 12 + len(GLB_BODY)
+    assert backend.requests[0][3] == 1 # response_fmt glTF
+
+def test_text_gltf_read_until_close(backend_factory):
+    backend = backend_factory(handler=lambda req: b'{"asset": {"version": "2.0"}}')
+    assert FFLClient(port=backend.port).export_model(_payload()) == b'{"asset": {"version": "2.0"}}'
+
+def test_rejects_non_gltf(backend):
+    with pytest.raises(RenderError, match="glTF"):
+        FFLClient(port=backend.port).export_model(_payload())
+
+def test_streams_into_sink(backend_factory):
+    backend = backend_factory(handler=glb_handler)
+    sink = io.BytesIO()
+
+    assert FFLClient(port=backend.port).export_model(_payload(), sink=sink) == 12 + len(GLB_BODY)
+    assert sink.getvalue()[12:] == GLB_BODY
+
+def test_cached_by_geometry(renderer_factory, backend_factory):
+    backend = backend_factory(handler=glb_handler)
+    renderer = renderer_factory([backend])
+
+    first = renderer.export_model(MII, camera_rot=(0, 30, 0))
+    # Camera and background don't change the model
+    assert renderer.export_model(MII, bg_color=(255, 0, 0, 255)) == first
+    assert len(backend.requests) == 1
+
+    renderer.export_model(MII, expression=Expression.SMILE)
+    assert len(backend.requests) == 2
+    # Not in any list of geometry fields, still not served from the cache
+    renderer.export_model(MII, instance_count=3)
+    assert len(backend.requests) == 3
+
+def test_concurrent_exports_share_one_call(renderer_factory, backend_factory):
+    backend = backend_factory(handler=glb_handler, delay=0.2)
+    renderer = renderer_factory([backend], workers=4)
+    sinks = [io.BytesIO() for _ in range(4)]
+    threads = [threading.Thread(target=renderer.export_model, args=(MII,), kwargs={"sink": s})
+               for s in sinks]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+
+    assert len(backend.requests) == 1
+    assert all(len(s.getvalue()) == 12 + len(GLB_BODY) for s in sinks)
+
+def test_shared_export_keeps_own_timeout(renderer_factory, backend_factory):
+    import time
+    backend = backend_factory(handler=glb_handler, delay=0.8)
+    renderer = renderer_factory([backend], workers=2)
+    leader = threading.Thread(target=renderer.export_model, args=(MII,))
+    leader.start()
+    time.sleep(0.1)
+
+    start = time.monotonic()
+    with pytest.raises(RenderTimeout):
+        renderer.export_model(MII, timeout=0.1)
+    assert time.monotonic() - start < 0.5
+    leader.join(5)
+    assert len(backend.requests) == 1
+
+def test_disk_cache_extension(tmp_path):
+    cache = MeshCache(str(tmp_path))
+    cache.put("binary", b"glTF" + bytes(8))
+    cache.put("text", b"{}")
+
+    assert sorted(os.listdir(tmp_path)) == ["binary.glb", "text.gltf"]
+    reloaded = MeshCache(str(tmp_path))
+    assert reloaded.get("text") == b"{}"
+    assert reloaded.get("missing") is None
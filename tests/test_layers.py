@@ -0,0 +1,75 @@
+# tests/test_layers.py
+from mii import RenderSettings, ClothesColor, Expression, SplitMode
+from fake_backend import make_tga
+from conftest import MII
+
+def _key(layer, **changes):
+    settings = RenderSettings()
+    for k, v in changes.items():
+        setattr(settings, k, v)
+    return settings.layer_key(MII, layer)
+
+def test_layer_keys():
+    assert _key('head', bg_color=(1, 2, 3, 255)) == _key('head')
+    assert _key('body', bg_color=(1, 2, 3, 255)) == _key('body')
+
+    assert _key('head', clothes_color=ClothesColor.RED) == _key('head')
+    assert _key('body', clothes_color=ClothesColor.RED) != _key('body')
+
+    assert _key('body', expression=Expression.SMILE) == _key('body')
+    assert _key('head', expression=Expression.SMILE) != _key('head')
+
+    # The head sits on the body model
+    assert _key('head', body_type=1) != _key('head')
+    assert _key('body', body_type=1) != _key('body')
+
+    assert _key('head') != _key('body')
+    assert _key('head', split_mode=SplitMode.HEAD) == _key('head')
+
+def split_handler(request):
+    """Head in the top half of the square, body in the bottom half (bottom-up rows)."""
+    res, split = request[4], request[-1]
+    quarter = res // 4
+
+    def pixel(x, y):
+        inside = quarter <= x < res - quarter and quarter <= y < res - quarter
+        top = y >= res // 2
+        if inside and (split == SplitMode.NONE or (split == SplitMode.HEAD) == top):
+            return (255, 0, 0, 255)
+        return (0, 0, 0, 0)
+    return b"".join(make_tga(res, res, pixel))
+
+def test_split_layers_are_cached_separately(renderer_factory, backend_factory):
+    backend = backend_factory(handler=split_handler)
+    renderer = renderer_factory([backend])
+
+    img = renderer.render_layered(MII, size=32, bg_color=(0, 0, 255, 255))
+    assert renderer.split_layers is True
+    assert img.getpixel((0, 0)) == (0, 0, 255, 255)
+    assert img.getpixel((16, 10)) == img.getpixel((16, 20)) == (255, 0, 0, 255)
+    first = len(backend.requests) # body, head and the check against the whole model
+
+    renderer.render_layered(MII, size=32, bg_color=(0, 255, 0, 255))
+    assert len(backend.requests) == first
+
+    renderer.render_layered(MII, size=32, clothes_color=ClothesColor.RED)
+    assert [r[-1] for r in backend.requests[first:]] == [SplitMode.BODY]
+
+    renderer.render_layered(MII, size=32, clothes_color=ClothesColor.RED, expression=Expression.SMILE)
+    assert [r[-1] for r in backend.requests[first + 1:]] == [SplitMode.HEAD]
+
+def test_falls_back_when_backend_does_not_split(renderer_factory, backend_factory):
+    # The default fake backend ignores split_mode and always draws the whole model
+    backend = backend_factory()
+    renderer = renderer_factory([backend])
+
+    img = renderer.render_layered(MII, size=32, bg_color=(0, 0, 255, 255))
+    assert renderer.split_layers is False
+    assert img.getpixel((16, 16)) == (255, 0, 0, 255)
+    first = len(backend.requests)
+
+    renderer.render_layered(MII, size=32, bg_color=(0, 255, 0, 255))
+    assert len(backend.requests) == first
+
+    renderer.render_layered(MII, size=32, clothes_color=ClothesColor.RED)
+    assert [r[-1] for r in backend.requests[first:]] == [SplitMode.NONE]
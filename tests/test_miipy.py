@@ -0,0 +1,40 @@
+# tests/test_miipy.py
+import threading
+
+import pytest
+
+from mii import RenderError
+
+from conftest import MII
+
+def test_render(renderer):
+    img = renderer.render(MII, size=32, zoom=64)
+    assert img.size == (32, 32)
+
+def test_cancelled_on_close_raises_render_error(renderer_factory, backend_factory):
+    renderer = renderer_factory([backend_factory(delay=0.3)])
+    errors = []
+
+    def render():
+        try:
+            renderer.render(MII, size=32)
+        except RenderError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=render) for _ in range(2)]
+    for t in threads:
+        t.start()
+    threading.Event().wait(0.1)
+    renderer.close()
+    for t in threads:
+        t.join(5)
+
+    assert any("cancelled" in str(e) for e in errors)
+
+def test_compress_applies_to_animation(renderer_factory, backend_factory):
+    backend = backend_factory()
+    renderer = renderer_factory([backend], compress=True)
+    renderer.render(MII, size=32)
+    renderer.animate(MII, size=32).frame()
+
+    assert [r[3] for r in backend.requests] == [3, 3] # TGA_RLE
@@ -0,0 +1,83 @@
+# tests/test_progressive.py
+import asyncio
+import threading
+
+import pytest
+
+from mii import RenderError, ShaderType
+from conftest import MII
+
+def test_preview_then_full(renderer, backend_factory):
+    r = renderer.render(MII, size=64, zoom=256, progressive=True, aa_method=1)
+    full = r.result(5)
+
+    assert r.preview.size == full.size == (64, 64)
+
+def test_preview_keeps_framing(renderer_factory, backend_factory):
+    backend = backend_factory()
+    renderer = renderer_factory([backend])
+    renderer.render(MII, size=64, zoom=256, progressive=True, aa_method=1).result(5)
+
+    preview, full = backend.requests
+    # Same resolution (camera distance), cheaper textures, AA and shader
+    assert preview[4] == full[4] == 256
+    assert (preview[5], preview[23], preview[8]) == (128, 0, ShaderType.SIMPLE)
+    assert (full[5], full[23], full[8]) == (256, 1, ShaderType.DEFAULT)
+
+def test_callback_can_render_again(renderer_factory):
+    # A single worker: the callback must not run on it, or the nested render would wait forever
+    renderer = renderer_factory(workers=1)
+    done = threading.Event()
+    nested = []
+
+    def callback(img):
+        nested.append(renderer.render(MII, size=16))
+        done.set()
+
+    renderer.render(MII, size=32, progressive=True, callback=callback)
+    assert done.wait(5)
+    assert nested[0].size == (16, 16)
+
+def test_callback_can_wait_for_nested_progressive(renderer_factory):
+    renderer = renderer_factory(workers=1)
+    done = threading.Event()
+    nested = []
+
+    def callback(img):
+        nested.append(renderer.render(MII, size=16, progressive=True).result(3))
+        done.set()
+
+    renderer.render(MII, size=32, progressive=True, callback=callback)
+    assert done.wait(5)
+    assert nested[0].size == (16, 16)
+
+def test_render_from_worker_fails_fast(renderer):
+    future = renderer.scheduler.submit(lambda deadline=None: renderer.render(MII, size=16))
+
+    with pytest.raises(RenderError, match="worker"):
+        future.result(5)
+
+def test_newer_request_in_session_cancels_older(renderer_factory, backend_factory):
+    renderer = renderer_factory([backend_factory(delay=0.1)], workers=1)
+    first = renderer.render(MII, size=32, progressive=True, session="editor")
+    second = renderer.render(MII, size=32, progressive=True, session="editor")
+
+    assert first.cancelled()
+    assert second.result(5).size == (32, 32)
+
+def test_iteration(renderer):
+    r = renderer.render(MII, size=32, progressive=True)
+    assert [img.size for img in r] == [(32, 32), (32, 32)]
+
+    async def collect():
+        return [img.size async for img in renderer.render(MII, size=16, progressive=True)]
+    assert asyncio.run(collect()) == [(16, 16), (16, 16)]
+
+def test_animation_frames_supersede(renderer_factory, backend_factory):
+    renderer = renderer_factory([backend_factory(delay=0.1)], workers=1)
+    anim = renderer.animate(MII, size=32)
+    first = anim.frame(progressive=True, zoom=64)
+    second = anim.frame(progressive=True, zoom=80)
+
+    assert first.cancelled()
+    assert second.result(5).size == (32, 32)
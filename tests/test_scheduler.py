@@ -0,0 +1,136 @@
+# tests/test_scheduler.py
+import threading
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+from mii import Priority, RenderError, RenderTimeout, QueueFullError
+from mii.scheduler import RenderScheduler
+
+def _job(value, delay=0.0, deadline=None):
+    time.sleep(delay)
+    return value
+
+@pytest.fixture
+def scheduler():
+    s = RenderScheduler(workers=1, max_queue=2)
+    yield s
+    s.close()
+
+def _block(scheduler):
+    """Occupies the single worker until the returned event is set."""
+    gate = threading.Event()
+    started = threading.Event()
+
+    def hold(deadline=None):
+        started.set()
+        gate.wait(5)
+
+    scheduler.submit(hold)
+    started.wait(5)
+    return gate
+
+def test_result(scheduler):
+    assert scheduler.submit(_job, 42).result(5) == 42
+    assert scheduler.stats()["completed"] == 1
+
+def test_queue_full(scheduler):
+    gate = _block(scheduler)
+    scheduler.submit(_job, 1)
+    scheduler.submit(_job, 2)
+
+    with pytest.raises(QueueFullError):
+        scheduler.submit(_job, 3)
+    assert scheduler.stats()["rejected"] == 1
+    gate.set()
+
+def test_interactive_before_batch(scheduler):
+    gate = _block(scheduler)
+    order = []
+    record = lambda name, deadline=None: order.append(name)
+    batch = scheduler.submit(record, "batch", priority=Priority.BATCH)
+    interactive = scheduler.submit(record, "interactive", priority=Priority.INTERACTIVE)
+    gate.set()
+
+    batch.result(5)
+    interactive.result(5)
+    assert order == ["interactive", "batch"]
+
+def test_rejects_deadline_that_cannot_be_met(scheduler):
+    scheduler.submit(_job, 1, 0.2).result(5) # Teach it that jobs take ~0.2s
+
+    with pytest.raises(RenderTimeout, match="cannot be met"):
+        scheduler.submit(_job, 2, deadline=time.monotonic() + 0.05)
+
+def test_deadline_expires_while_queued(scheduler):
+    gate = _block(scheduler)
+    future = scheduler.submit(_job, 1, deadline=time.monotonic() + 0.05)
+    time.sleep(0.1)
+    gate.set()
+
+    with pytest.raises(RenderTimeout, match="expired"):
+        future.result(5)
+    assert scheduler.stats()["expired"] == 1
+
+def test_deadline_is_passed_to_job(scheduler):
+    deadline = time.monotonic() + 5
+    assert scheduler.submit(lambda deadline=None: deadline, deadline=deadline).result(5) == deadline
+
+def test_close_cancels_queued_jobs(scheduler):
+    gate = _block(scheduler)
+    queued = scheduler.submit(_job, 1)
+    threading.Timer(0.1, gate.set).start()
+    scheduler.close()
+
+    with pytest.raises(CancelledError):
+        queued.result(5)
+    with pytest.raises(RenderError, match="closed"):
+        scheduler.submit(_job, 2)
+
+def test_resize(scheduler):
+    scheduler.resize(3)
+    gates = [_block(scheduler) for _ in range(3)] # Would hang with one worker
+    for gate in gates:
+        gate.set()
+
+    scheduler.resize(1)
+    assert scheduler.submit(_job, 1).result(5) == 1
+    for _ in range(50):
+        if len(scheduler._threads) == 1:
+            break
+        time.sleep(0.02)
+    assert len(scheduler._threads) == 1
+    assert scheduler.stats()["workers"] == 1
+
+def test_close_after_shrink(scheduler):
+    scheduler.resize(2)
+    gate = _block(scheduler)
+    scheduler.resize(1) # Stop marker stays queued behind the blocked job
+    threading.Timer(0.1, gate.set).start()
+    scheduler.close()
+
+def test_shrink_under_load():
+    scheduler = RenderScheduler(workers=3, max_queue=10)
+    gates = [_block(scheduler) for _ in range(3)]
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def job(deadline=None):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+
+    futures = [scheduler.submit(job) for _ in range(6)]
+    scheduler.resize(1) # The queue is not empty, surplus workers still stop after their job
+    for gate in gates:
+        gate.set()
+    for f in futures:
+        f.result(5)
+
+    assert peak[0] == 1
+    assert len(scheduler._threads) == 1
+    scheduler.close()
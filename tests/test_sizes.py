@@ -0,0 +1,24 @@
+# tests/test_sizes.py
+import pytest
+
+from conftest import MII
+
+def test_one_render_for_all_sizes(renderer_factory, backend_factory, tmp_path):
+    backend = backend_factory()
+    renderer = renderer_factory([backend])
+    images = renderer.render_sizes(MII, sizes=[32, 128, 64], out=str(tmp_path / "a_{size}.png"), zoom=256)
+
+    assert {size: img.size for size, img in images.items()} == {
+        128: (128, 128), 64: (64, 64), 32: (32, 32)
+    }
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a_128.png", "a_32.png", "a_64.png"]
+    assert len(backend.requests) == 1
+    assert backend.requests[0][4] == 256
+
+def test_template_needs_size(renderer, tmp_path):
+    with pytest.raises(ValueError, match="size"):
+        renderer.render_sizes(MII, sizes=[64, 32], out=str(tmp_path / "a.png"))
+
+def test_sizes_must_be_positive(renderer):
+    with pytest.raises(ValueError):
+        renderer.render_sizes(MII, sizes=[0])